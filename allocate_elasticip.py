@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List
 import boto3
 
@@ -9,19 +10,39 @@ import boto3
 # \\"detail\\":{\\"Status\\":[\\"Ready\\"],\\"ApplicationName\\":\
 # [\\"my-application-name\\"],\\"EnvironmentName\\":[\\"my-environment-name\\"]}}"
 
+def describe_first_instance(client, filters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # The paginator is lazy, so no page after the one holding the first
+    # instance is requested
+    instance = next(
+        (
+            instance
+            for page in client.get_paginator("describe_instances").paginate(
+                Filters=filters
+            )
+            for reservation in page["Reservations"]
+            for instance in reservation["Instances"]
+        ),
+        None,
+    )
+    if instance is None:
+        raise IndexError("No instance found for the environment")
+    return instance
+
+
 def lambda_handler(event, context):
     client = boto3.client("ec2")
     env_list: List[str] = event["detail"]["EnvironmentName"]
 
-    desc_instance: Dict[str, Any] = client.describe_instances(
-        Filters=[{"Name": "tag:Name", "Values": env_list}]
-    )
-    instance: Dict[str, Any] = desc_instance["Reservations"][0]["Instances"][0]
-    network_interface_id: str = instance["NetworkInterfaces"][0]["NetworkInterfaceId"]
+    filters: List[Dict[str, Any]] = [{"Name": "tag:Name", "Values": env_list}]
 
-    desc_address: Dict[str, Any] = client.describe_addresses(
-        Filters=[{"Name": "tag:Name", "Values": env_list}]
-    )
+    # Both describe calls are independent, so they run at the same time
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        f_instance = executor.submit(describe_first_instance, client, filters)
+        f_address = executor.submit(client.describe_addresses, Filters=filters)
+        instance: Dict[str, Any] = f_instance.result()
+        desc_address: Dict[str, Any] = f_address.result()
+
+    network_interface_id: str = instance["NetworkInterfaces"][0]["NetworkInterfaceId"]
     allocation_id = desc_address["Addresses"][0]["AllocationId"]
 
     return client.associate_address(
@@ -1,13 +1,22 @@
 #!/usr/bin/env python
 from argparse import ArgumentParser, Namespace
-from typing import Any, Dict, List, Pattern, Union
+from collections import defaultdict
+from importlib.util import find_spec
+from typing import Any, Dict, List, NamedTuple, Set, Union
 
 import asyncio
 import base64
-import httpx
-import json
+import math
 import os
-import re
+
+try:
+    import httpx
+    import orjson
+except ModuleNotFoundError as e:
+    import sys
+
+    print(e, file=sys.stderr)
+    sys.exit(1)
 
 BITBUCKET_API_BASE_URL = os.environ["BITBUCKET_API_BASE_URL"]
 BITBUCKET_BASE_URL = os.environ["BITBUCKET_BASE_URL"]
@@ -17,46 +26,147 @@ JIRA_TOKEN = os.environ["JIRA_TOKEN"]
 JIRA_USERNAME = os.environ["JIRA_USERNAME"]
 JIRA_AUTH: str = base64.b64encode(f"{JIRA_USERNAME}:{JIRA_TOKEN}".encode()).decode()
 
+BITBUCKET_MAX_PAGES = int(os.environ.get("BITBUCKET_MAX_PAGES", 10))
+BITBUCKET_PAGELEN = 50
+BITBUCKET_QUERY_BATCH_SIZE = 25
+JIRA_MAX_PAGES = int(os.environ.get("JIRA_MAX_PAGES", 10))
+JIRA_MAX_RESULTS = 100
+MAX_CONCURRENT_REQUESTS = 8
+
+# Headers and params are the same for every request, so they are built once
+BITBUCKET_HEADERS: Dict[str, str] = {
+    "Authorization": f"Bearer {BITBUCKET_TOKEN}",
+    "Accept": "application/json",
+}
+BITBUCKET_PARAMS: Dict[str, Any] = {
+    "sort": "-created_on",
+    "pagelen": BITBUCKET_PAGELEN,
+}
+JIRA_HEADERS: Dict[str, str] = {
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+    "Authorization": f"Basic {JIRA_AUTH}",
+}
+
+
+class Pipeline(NamedTuple):
+    url: str
+    branch: str
+    build_number: int
+
+
+class PullRequest(NamedTuple):
+    url: str
+    branch: str
+
+
+async def get_bitbucket_page(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    url: str,
+    params: Union[Dict[str, Any], None] = None,
+) -> Dict[str, Any]:
+    async with sem:
+        response = await client.get(
+            url,
+            headers=BITBUCKET_HEADERS,
+            params=params,
+        )
+    if response.status_code != 200:
+        return {}
+    return orjson.loads(response.content)
+
 
-async def get_bitbucket_response(endpoint: str) -> List[Any]:
+async def get_bitbucket_response(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    endpoint: str,
+    q: Union[str, None] = None,
+) -> List[Any]:
     if endpoint.endswith("/"):
         endpoint = endpoint[:-1]
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{BITBUCKET_API_BASE_URL}/{endpoint}/",
-            headers={
-                "Authorization": f"Bearer {BITBUCKET_TOKEN}",
-                "Accept": "application/json",
-            },
-            params={"sort": "-created_on"},
-        )
-        if response.status_code != 200:
-            return []
-        return response.json()["values"]
+    url = f"{BITBUCKET_API_BASE_URL}/{endpoint}/"
 
+    params: Dict[str, Any] = {**BITBUCKET_PARAMS}
+    if q:
+        params["q"] = q
 
-async def get_jiras_response(
-    jiras: Union[List[str], None] = None, only_done: bool = False
-) -> List[Dict[str, Any]]:
-    if jiras is None:
-        jiras = []
-
-    if only_done:
-        q = "status IN ('Pronto para produção','Última Revisão de Código')"
+    first_page: Dict[str, Any] = await get_bitbucket_page(
+        client, sem, url, {**params, "page": 1}
+    )
+    values: List[Any] = first_page.get("values", [])
+
+    if "size" in first_page:
+        # When Bitbucket tells us the total size, every remaining page is
+        # known upfront and can be fetched concurrently
+        pagelen: int = first_page.get("pagelen") or BITBUCKET_PAGELEN
+        last_page = min(
+            math.ceil(first_page["size"] / pagelen),
+            BITBUCKET_MAX_PAGES,
+        )
+        pages = await asyncio.gather(
+            *[
+                get_bitbucket_page(client, sem, url, {**params, "page": p})
+                for p in range(2, last_page + 1)
+            ]
+        )
+        for page in pages:
+            values += page.get("values", [])
     else:
-        q = " OR ".join(f"(text ~ {jira} OR issuekey = {jira})" for jira in jiras)
+        # Otherwise follows the next links one page at a time, they already
+        # carry every query param needed
+        fetched, current = 1, first_page
+        while current.get("next") and fetched < BITBUCKET_MAX_PAGES:
+            fetched += 1
+            current = await get_bitbucket_page(client, sem, current["next"])
+            values += current.get("values", [])
+
+    return values
+
+
+async def get_pullrequests_response(
+    client: httpx.AsyncClient, sem: asyncio.Semaphore, keys: List[str]
+) -> List[Any]:
+    """
+    Pull requests are filtered by Bitbucket itself to only the ones whose
+    branch mentions one of the keys. The keys are split into batches so the
+    query string stays short enough for Bitbucket to accept it.
+    """
+    responses = await asyncio.gather(
+        *[
+            get_bitbucket_response(
+                client,
+                sem,
+                "pullrequests",
+                q=" OR ".join(
+                    f'source.branch.name ~ "{key}"'
+                    for key in keys[i : i + BITBUCKET_QUERY_BATCH_SIZE]
+                ),
+            )
+            for i in range(0, len(keys), BITBUCKET_QUERY_BATCH_SIZE)
+        ]
+    )
+
+    # A branch can match keys from more than one batch, since ~ is a partial
+    # match, so pull requests are deduplicated by their id
+    pullrequests: Dict[Any, Any] = {}
+    for response in responses:
+        for pr in response:
+            pullrequests.setdefault(pr["id"], pr)
+    return list(pullrequests.values())
 
-    async with httpx.AsyncClient() as client:
+
+async def get_jiras_page(
+    client: httpx.AsyncClient, sem: asyncio.Semaphore, jql: str, start_at: int
+) -> Dict[str, Any]:
+    async with sem:
         response = await client.post(
             f"{JIRA_API_HOST}/rest/api/2/search/",
             json={
-                "jql": f"""
-                    project = "AJ" AND (
-                        {q}
-                    ) ORDER BY created DESC
-                """,
-                "maxResults": 20,
+                "jql": jql,
+                "startAt": start_at,
+                "maxResults": JIRA_MAX_RESULTS,
                 "fields": [
                     "id",
                     "key",
@@ -67,61 +177,82 @@ async def get_jiras_response(
                     "assignee",
                 ],
             },
-            headers={
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-                "Authorization": f"Basic {JIRA_AUTH}",
-            },
+            headers=JIRA_HEADERS,
         )
-        if response.status_code != 200:
-            return []
-        return response.json()["issues"]
+    if response.status_code != 200:
+        return {}
+    return orjson.loads(response.content)
 
 
-async def parse_pipelines(
+async def get_jiras_response(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    jiras: Union[List[str], None] = None,
+    only_done: bool = False,
+) -> List[Dict[str, Any]]:
+    if jiras is None:
+        jiras = []
+
+    if only_done:
+        q = "status IN ('Pronto para produção','Última Revisão de Código')"
+    else:
+        q = " OR ".join(f"(text ~ {jira} OR issuekey = {jira})" for jira in jiras)
+
+    jql = f'project = "AJ" AND ({q}) ORDER BY created DESC'
+
+    first_page: Dict[str, Any] = await get_jiras_page(client, sem, jql, 0)
+    issues: List[Dict[str, Any]] = first_page.get("issues", [])
+
+    # Jira may cap maxResults below what was asked, so the page size it
+    # answered with is used to step through the remaining results
+    step: int = first_page.get("maxResults") or JIRA_MAX_RESULTS
+    last: int = min(first_page.get("total", 0), step * JIRA_MAX_PAGES)
+    pages = await asyncio.gather(
+        *[
+            get_jiras_page(client, sem, jql, start_at)
+            for start_at in range(step, last, step)
+        ]
+    )
+    for page in pages:
+        issues += page.get("issues", [])
+
+    return issues
+
+
+def parse_pipelines(
     raw_pipelines: List[Any],
-    compiled_regex: Pattern[str],
-) -> Dict[str, List[Dict[str, Any]]]:
+    keys: Set[str],
+) -> Dict[str, List[Pipeline]]:
     pipeline_base_url = f"{BITBUCKET_BASE_URL}/pipelines/results"
 
-    pipelines: Dict[str, List[Dict[str, Any]]] = {}
+    pipelines: Dict[str, List[Pipeline]] = defaultdict(list)
 
     for pipeline in raw_pipelines:
         branch: str = pipeline["target"]["ref_name"]
         build_number: int = pipeline["build_number"]
-        if compiled_regex.search(branch):
-            key: str = branch.split("/")[-1]
-            if not pipelines.get(key):
-                pipelines[key] = []
+        key: str = branch.rsplit("/", 1)[-1]
+        if key in keys:
             pipelines[key].append(
-                {
-                    "url": f"{pipeline_base_url}/{build_number}",
-                    "branch": branch,
-                    "build_number": build_number,
-                }
+                Pipeline(f"{pipeline_base_url}/{build_number}", branch, build_number)
             )
     return pipelines
 
 
-async def parse_pullrequests(
+def parse_pullrequests(
     raw_pullrequests: List[Any],
-    compiled_regex: Pattern[str],
-) -> Dict[str, List[Dict[str, str]]]:
-    pullrequests: Dict[str, List[Dict[str, str]]] = {}
+    keys: Set[str],
+) -> Dict[str, List[PullRequest]]:
+    pullrequests: Dict[str, List[PullRequest]] = defaultdict(list)
 
     for pr in raw_pullrequests:
         branch: str = pr["source"]["branch"]["name"]
-        if compiled_regex.search(branch):
-            key: str = branch.split("/")[-1]
-            if not pullrequests.get(key):
-                pullrequests[key] = []
-            pullrequests[key].append(
-                {"url": pr["links"]["html"]["href"], "branch": branch}
-            )
+        key: str = branch.rsplit("/", 1)[-1]
+        if key in keys:
+            pullrequests[key].append(PullRequest(pr["links"]["html"]["href"], branch))
     return pullrequests
 
 
-async def parse_result(
+def parse_result(
     jira_response: List[Dict[str, Any]],
     pullrequests_response: List[Dict[str, Any]],
     pipelines_response: List[Dict[str, Any]],
@@ -143,47 +274,35 @@ async def parse_result(
             "pipelines": [],
         }
 
-    compiled_regex: Pattern[str] = re.compile("|".join(results.keys()))
+    # Only branches whose last segment is exactly one of the jira keys count
+    keys: Set[str] = set(results)
 
-    pullrequests, pipelines = await asyncio.gather(
-        *[
-            parse_pullrequests(pullrequests_response, compiled_regex),
-            parse_pipelines(pipelines_response, compiled_regex),
-        ]
-    )
-
-    for key, pipes in pipelines.items():
-        if results.get(key):
-            filtered_pipelines: Dict[str, Any] = {
-                "migrations": [],
-                "regular_pr": [],
-            }
+    pullrequests = parse_pullrequests(pullrequests_response, keys)
+    pipelines = parse_pipelines(pipelines_response, keys)
 
-            last_build_number = 0
+    for jira_id, issue in results.items():
+        issue["pullrequests"] = pullrequests.get(jira_id, [])
 
-            for p in pipes:
-                if "migra" in p["branch"]:
-                    filtered_pipelines["migrations"].append(p)
-                elif last_build_number < p["build_number"]:
-                    # Keeps only the pipeline with the biggest build_number if
-                    # it's not a migration pipeline
-                    filtered_pipelines["regular_pr"] = [p]
-                    last_build_number = p["build_number"]
+        migrations: List[Pipeline] = []
+        best_regular: Union[Pipeline, None] = None
 
-            for p in filtered_pipelines.values():
-                results[key]["pipelines"] += p
+        for p in pipelines.get(jira_id, []):
+            if "migra" in p.branch:
+                migrations.append(p)
+            elif best_regular is None or best_regular.build_number < p.build_number:
+                # Keeps only the pipeline with the biggest build_number if
+                # it's not a migration pipeline
+                best_regular = p
 
-    for key, prs in pullrequests.items():
-        if results.get(key):
-            results[key]["pullrequests"] = prs
+        issue["pipelines"] = migrations + ([best_regular] if best_regular else [])
 
     return list(results.values())
 
 
 def format_result_output(result: List[Dict[str, Any]]) -> str:
-    output: str = ""
+    parts: List[str] = []
     for issue in result:
-        s: str = (
+        parts.append(
             "\n"
             f"\033[92m{issue['id']}\033[00m: {issue['status']} - {issue['type']}\n"
             f"Title: {issue['title'][:85]}\n"
@@ -197,13 +316,10 @@ def format_result_output(result: List[Dict[str, Any]]) -> str:
             ("pipelines", "Pipelines:\n"),
         ):
             if issue.get(key):
-                s += title + "".join(
-                    f"- {p['url']} ({p['branch']})\n" for p in issue.get(key, [])
-                )
-
-        output += s
+                parts.append(title)
+                parts.extend(f"- {p.url} ({p.branch})\n" for p in issue[key])
 
-    return output
+    return "".join(parts)
 
 
 def get_args() -> Namespace:
@@ -238,25 +354,48 @@ def get_args() -> Namespace:
 async def main() -> None:
     args: Namespace = get_args()
 
-    (
-        jira_response,
-        pullrequests_response,
-        pipelines_resonse,
-    ) = await asyncio.gather(
-        *[
-            get_jiras_response(jiras=args.jiras, only_done=args.pronto),
-            get_bitbucket_response("pullrequests"),
-            get_bitbucket_response("pipelines"),
-        ],
-        return_exceptions=True,
-    )
+    # A single client is shared by every request so the connections to Jira
+    # and Bitbucket are kept alive and reused instead of handshaking each time,
+    # and with http2 (when h2 is installed) the concurrent page requests share
+    # the same connection
+    async with httpx.AsyncClient(
+        http2=find_spec("h2") is not None,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    ) as client:
+        # Bounds how many page requests are in flight at once
+        sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        # Pipelines can't be filtered by a partial branch name on Bitbucket, so
+        # they are fetched while Jira is still being searched
+        pipelines_task = asyncio.create_task(
+            get_bitbucket_response(client, sem, "pipelines")
+        )
+
+        jira_response = await get_jiras_response(
+            client, sem, jiras=args.jiras, only_done=args.pronto
+        )
+
+        pullrequests_response, pipelines_resonse = await asyncio.gather(
+            *[
+                get_pullrequests_response(
+                    client, sem, [jira["key"] for jira in jira_response]
+                ),
+                pipelines_task,
+            ],
+            return_exceptions=True,
+        )
 
-    result: List[Dict[str, Any]] = await parse_result(
+    result: List[Dict[str, Any]] = parse_result(
         jira_response, pullrequests_response, pipelines_resonse
     )
 
     if args.json:
-        print(json.dumps(result))
+        # Pull requests and pipelines are namedtuples, orjson needs them as dicts
+        for issue in result:
+            for key in ("pullrequests", "pipelines"):
+                issue[key] = [p._asdict() for p in issue[key]]
+        print(orjson.dumps(result).decode())
     else:
         print(format_result_output(result))
 
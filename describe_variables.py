@@ -1,13 +1,14 @@
 #!/usr/bin/env python
 from argparse import ArgumentParser, Namespace, RawTextHelpFormatter
-from typing import Any, Dict, Iterable, List, Union
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple, Union
 import os
 
 try:
-    from redis import Redis
+    from redis import ConnectionPool, Redis
     from redis.exceptions import ConnectionError
     import boto3  # type: ignore
+    import orjson
 except ModuleNotFoundError as e:
     import sys
 
@@ -18,8 +19,17 @@ from datasets import ENVIRONMENTS
 
 
 class RedisHandler:
+    # Connection pools are shared by every handler with the same settings, so
+    # the socket to redis is opened once and reused
+    _pools: Dict[Tuple[Any, ...], ConnectionPool] = {}
+
     def __init__(self, db: int, **kwargs: Dict[str, Any]) -> None:
-        self._r = Redis(db=db, socket_connect_timeout=1, **kwargs)  # pyright: ignore
+        pool_key: Tuple[Any, ...] = (db, *sorted(kwargs.items()))
+        if pool_key not in self._pools:
+            self._pools[pool_key] = ConnectionPool(
+                db=db, socket_connect_timeout=1, max_connections=16, **kwargs
+            )
+        self._r = Redis(connection_pool=self._pools[pool_key])
         self.__bool = None
 
     def __bool__(self) -> bool:
@@ -32,14 +42,24 @@ class RedisHandler:
             self.__bool = False
         return self.__bool
 
-    def getkey(self, key: str) -> Dict[str, Any]:
-        value = self._r.get(key)
-        return json.loads(value.decode()) if value else {}
+    def mget(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        # Only keys that were found are returned
+        if not keys:
+            return {}
+        return {
+            key: orjson.loads(value)
+            for key, value in zip(keys, self._r.mget(keys))
+            if value
+        }
 
-    def setkey(self, key: str, value: Any, timeout: Union[int, None] = None) -> None:
-        self._r.set(key, json.dumps(value))
-        if timeout:
-            self._r.expire(key, timeout)
+    def mset(
+        self, mapping: Dict[str, Any], timeout: Union[int, None] = None
+    ) -> None:
+        # Sets every key in a single roundtrip
+        pipe = self._r.pipeline()
+        for key, value in mapping.items():
+            pipe.set(key, orjson.dumps(value), ex=timeout)
+        pipe.execute()
 
 
 class Handler:
@@ -49,40 +69,65 @@ class Handler:
         self._client = self._get_client(**kwargs)
 
     def get_environment_variables(self, env_name: str, app_name: str) -> Dict[str, Any]:
-        env_vars: Dict[str, Any]
-
+        return self.get_environments_variables([(env_name, app_name)])[0]
+
+    def get_environments_variables(
+        self, environments: List[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Returns the variables of every (env_name, app_name) pair, in order.
+
+        All keys are looked up on redis with a single MGET and the cache misses
+        are described concurrently on ElasticBeanstalk.
+        """
+        keys: List[str] = [
+            f"{env_name}__{app_name}" for env_name, app_name in environments
+        ]
+
+        cached: Dict[str, Dict[str, Any]]
         if self.invalidate or not self._redis:
-            # Skips getkey operation if set to not use redis or redis is not
+            # Skips mget operation if set to not use redis or redis is not
             # available on the machine, or the HOST/PORT is wrong
-            env_vars = {}
+            cached = {}
         else:
             # Else tries to look for env_vars cached on redis
-            env_vars = self._redis.getkey(f"{env_name}__{app_name}")
-
-        if not env_vars:
-            get_env: Dict[str, Any] = self._client.describe_configuration_settings(
-                EnvironmentName=env_name, ApplicationName=app_name
-            )
-
-            env_vars = {
-                e["OptionName"]: e["Value"]
-                for e in (  # type: ignore
-                    filter(
-                        lambda x: x["Namespace"]  # type: ignore
-                        == "aws:elasticbeanstalk:application:environment",
-                        get_env["ConfigurationSettings"][0]["OptionSettings"],
+            cached = self._redis.mget(keys)
+
+        misses: List[Tuple[str, Tuple[str, str]]] = [
+            (key, env) for key, env in zip(keys, environments) if not cached.get(key)
+        ]
+
+        if misses:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                fetched: List[Dict[str, Any]] = list(
+                    executor.map(
+                        lambda env: self._describe_environment_variables(*env),
+                        (env for _, env in misses),
                     )
                 )
+
+            found: Dict[str, Dict[str, Any]] = {
+                key: env_vars for (key, _), env_vars in zip(misses, fetched)
             }
+            cached.update(found)
 
             if self._redis:
-                self._redis.setkey(  # type: ignore
-                    key=f"{env_name}__{app_name}",
-                    value=env_vars,
-                    timeout=14400,
-                )
+                self._redis.mset(found, timeout=14400)
 
-        return env_vars
+        return [cached[key] for key in keys]
+
+    def _describe_environment_variables(
+        self, env_name: str, app_name: str
+    ) -> Dict[str, Any]:
+        get_env: Dict[str, Any] = self._client.describe_configuration_settings(
+            EnvironmentName=env_name, ApplicationName=app_name
+        )
+
+        return {
+            e["OptionName"]: e["Value"]
+            for e in get_env["ConfigurationSettings"][0]["OptionSettings"]
+            if e["Namespace"] == "aws:elasticbeanstalk:application:environment"
+        }
 
     def _get_client(self, **kwargs):
         if (
@@ -175,25 +220,30 @@ def main(args: Namespace) -> None:
 
     loop_envs: Iterable[str] = args.envs if args.envs else ENVIRONMENTS.keys()
 
-    for env in loop_envs:
-        e: Union[Dict[str, str], None] = ENVIRONMENTS.get(env)
-
-        if e is None:
-            continue
+    # Resolves every requested environment once, skipping unknown ones
+    targets: List[Tuple[str, str, str]] = [
+        (env, e["env_name"], e["app_name"])
+        for env in loop_envs
+        for e in (ENVIRONMENTS.get(env),)
+        if e is not None
+    ]
 
-        env_variables: Dict[str, Any] = h.get_environment_variables(
-            env_name=e["env_name"], app_name=e["app_name"]
-        )
+    all_variables: List[Dict[str, Any]] = h.get_environments_variables(
+        [(env_name, app_name) for _, env_name, app_name in targets]
+    )
 
-        # prints environment name in green
-        print("\033[92m{}:\033[00m".format(env))
+    for (env, _, _), env_variables in zip(targets, all_variables):
+        lines: List[str] = [
+            # environment name in green
+            f"\033[92m{env}:\033[00m"
+        ]
 
         if not args.variables:
-            for var, value in env_variables.items():
-                print(f"{var}={value}")
-        elif args.variables:
-            for var in args.variables:
-                print(f"{var}={env_variables.get(var)}")
+            lines.extend(f"{var}={value}" for var, value in env_variables.items())
+        else:
+            lines.extend(f"{var}={env_variables.get(var)}" for var in args.variables)
+
+        print("\n".join(lines))
 
 
 if __name__ == "__main__":
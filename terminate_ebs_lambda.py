@@ -4,11 +4,12 @@ import requests
 
 from boto3 import client as Client
 from botocore.exceptions import ClientError
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from re import sub
-from typing import List
+from requests.adapters import HTTPAdapter
+from typing import Any, Callable, Dict, Iterable, List
 
 
 
@@ -22,17 +23,69 @@ JIRA_USERNAME: str = os.environ.get("JIRA_USERNAME", "")
 SLACK_WEBHOOK_URL: str = os.environ.get("SLACK_WEBHOOK_URL", "")
 TO_FROM: str = os.environ.get("TO_FROM", "")
 
+# Clients and the http session live at module level so warm lambda invocations
+# reuse them and their open connections instead of building new ones
+SES = Client(
+    "ses",
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    region_name=AWS_REGION,
+)
+EB = Client(
+    "elasticbeanstalk",
+    aws_access_key_id=AWS_ACCESS_KEY_ID,
+    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+    region_name=AWS_REGION,
+)
+HTTP = requests.Session()
+HTTP.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=10))
+
+
+_STRIP_QUOTES = str.maketrans("", "", "\"'")
+
 
 def unquote_list_of_strings(list_of_strings: List[str]):
     """
     Converts a list of strings to a string and removes quotes
     """
-    return sub("\"|'", "", str(list_of_strings))
+    return str(list_of_strings).translate(_STRIP_QUOTES)
+
+
+def run_on_environments(
+    action: Callable[..., Any], environments: Iterable[Dict[str, Any]]
+) -> List[str]:
+    """
+    Calls an elasticbeanstalk action concurrently for every environment and
+    returns the names of the environments where it succeeded
+
+    Params:
+        action: Callable, like EB.terminate_environment
+        environments: Iterable of environment descriptions
+    """
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures: Dict[str, Future] = {
+            env["EnvironmentName"]: executor.submit(
+                action,
+                EnvironmentId=env["EnvironmentId"],
+                EnvironmentName=env["EnvironmentName"],
+            )
+            for env in environments
+        }
+
+    succeeded: List[str] = []
+    for name, future in futures.items():
+        try:
+            future.result()
+            succeeded.append(name)
+        except ClientError as e:
+            logging.error(e.response["Error"]["Message"])
+    return succeeded
 
 
 def send_raw_email(subject: str, message: str) -> None:
     """
-    Sends an email using AWS Simple Email Service
+    Sends an email using AWS Simple Email Service and posts the same message
+    to slack
 
     Params:
         subject: str
@@ -49,65 +102,58 @@ def send_raw_email(subject: str, message: str) -> None:
     msg_body = MIMEMultipart("alternative")
     msg_body.attach(MIMEText(message, "plain", "utf-8"))
     msg.attach(msg_body)
-    
-    ses_client = Client(
-        "ses",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION,
-    )
 
-    try:
-        ses_client.send_raw_email(
+    # The email and the slack message are independent, so both requests are
+    # sent at the same time
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        email = executor.submit(
+            SES.send_raw_email,
             Source=TO_FROM,
             Destinations=[TO_FROM],
             RawMessage={
                 "Data": msg.as_string(),
             },
         )
+        # Posts message to deploy slack channel via slack app webhook
+        slack = executor.submit(
+            HTTP.post,
+            SLACK_WEBHOOK_URL,
+            headers={"Content-type": "application/json"},
+            json={"text": message},
+        )
+
+    try:
+        email.result()
     except ClientError as e:
         logging.error(e.response["Error"]["Message"])
 
-    # Posts message to deploy slack channel via slack app webhook
-    requests.post(
-        SLACK_WEBHOOK_URL,
-        headers={"Content-type": "application/json"},
-        json={"text": message}
-    )
+    slack.result()
+
 
 def terminate_ebs() -> None:
     """
     Terminates ElasticBeanstalk dynamic environments every friday at 5pm.
 
-    The function connects to elasticbeanstalk with boto3.client and grabs the
+    The function uses the module level elasticbeanstalk client to grab the
     list of available environments and terminates all that pass the filter. The
     filter is the environment's name not being on a specific list of
     environments that we do not want to close and whose name does not begin with
     "AJ."
     """
 
-    eb_client = Client(
-        "elasticbeanstalk",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION,
-    )
-    eb_envs = eb_client.describe_environments(ApplicationName=APPLICATION_NAME)
-
-    if not "Environments" in eb_envs:
-        return
+    paginator = EB.get_paginator("describe_environments")
 
-    terminated_environments: List[str] = []
-    for env in filter(
-        lambda x: x["EnvironmentName"].startswith("AJ") and x["Status"] == "Ready",
-        eb_envs["Environments"],
-    ):
-        # Filters environments and only terminates the ones not in SKIP, that
-        # it's name starts with AJ and it's status is Ready
-        eb_client.terminate_environment(
-            EnvironmentId=env["EnvironmentId"], EnvironmentName=env["EnvironmentName"]
-        )
-        terminated_environments.append(env["EnvironmentName"])
+    # Filters environments and only terminates the ones not in SKIP, that
+    # it's name starts with AJ and it's status is Ready
+    terminated_environments: List[str] = run_on_environments(
+        EB.terminate_environment,
+        [
+            env
+            for page in paginator.paginate(ApplicationName=APPLICATION_NAME)
+            for env in page.get("Environments", [])
+            if env["EnvironmentName"].startswith("AJ") and env["Status"] == "Ready"
+        ],
+    )
 
     if terminated_environments:
         datetime_now = datetime.now()
@@ -131,13 +177,6 @@ def rebuild_ebs() -> None:
 
     """
 
-    ebs_client = Client(
-        "elasticbeanstalk",
-        aws_access_key_id=AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION,
-    )
-    
     # Queries for all jiras that are in testing but not in correction
     jira_query = {
         "jql": (
@@ -153,7 +192,7 @@ def rebuild_ebs() -> None:
         ),
         "maxResults": 20,
     }
-    jira_response = requests.get(
+    jira_response = HTTP.get(
         f"{JIRA_API_HOST}/rest/api/2/search/",
         params=jira_query,
         headers={"Accept": "application/json"},
@@ -167,30 +206,35 @@ def rebuild_ebs() -> None:
     # Uses the response from jira to build the EnvironmentNames list of strings
     # (names of environemnts) to make a GET request to elasticbeanstalk that
     # returns information about environments, even if it's already terminated
-    eb_envs = ebs_client.describe_environments(
-        EnvironmentNames=[
-            jira["key"].replace("-", "") for jira in jira_response.json()["issues"]
-        ],
-        IncludeDeleted=True,
-        IncludedDeletedBackTo=datetime.now() - timedelta(days=4)
+    paginator = EB.get_paginator("describe_environments")
+    eb_envs: List[Dict[str, Any]] = [
+        env
+        for page in paginator.paginate(
+            EnvironmentNames=[
+                jira["key"].replace("-", "") for jira in jira_response.json()["issues"]
+            ],
+            IncludeDeleted=True,
+            IncludedDeletedBackTo=datetime.now() - timedelta(days=4),
+        )
+        for env in page.get("Environments", [])
+    ]
+
+    # Keeps only the newest terminated environment of each name, because
+    # describe_environments could possibly return one or more environments
+    # with the same name
+    newest: Dict[str, Dict[str, Any]] = {}
+    for env in eb_envs:
+        if env["Status"] != "Terminated":
+            continue
+        current = newest.get(env["EnvironmentName"])
+        if current is None or env["DateCreated"] > current["DateCreated"]:
+            newest[env["EnvironmentName"]] = env
+
+    # Rebuilds environments that were found with describe_environments and
+    # that are Terminated
+    rebuilt_environments: List[str] = run_on_environments(
+        EB.rebuild_environment, newest.values()
     )
-    
-    rebuilt_environments: List[str] = []
-    for env in filter(
-        lambda x: x["Status"] == "Terminated",
-        sorted(eb_envs["Environments"], key=lambda x: x["DateCreated"], reverse=True),
-    ):
-        # Rebuilds environments that were found with describe_environments and
-        # that are Terminated
-        # it uses reversed sorted by DateCreated to make sure we only try to
-        # rebuild the newest environment of a jira, because it could possibly
-        # return one or more environments with the same name
-        if env["EnvironmentName"] not in rebuilt_environments:
-            ebs_client.rebuild_environment(
-                EnvironmentId=env["EnvironmentId"],
-                EnvironmentName=env["EnvironmentName"],
-            )
-            rebuilt_environments.append(env["EnvironmentName"])
 
     if rebuilt_environments:
         datetime_now = datetime.now()